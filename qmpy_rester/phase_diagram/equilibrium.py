@@ -27,7 +27,7 @@ class Equilibrium:
 
     @property
     def elements(self):
-        return sorted(set.union(*[p.space for p in self.phases]))
+        return sorted(set().union(*[p.space for p in self.phases]))
 
     @property
     def composition_matrix(self):
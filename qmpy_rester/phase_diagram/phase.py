@@ -1,17 +1,32 @@
 import numpy as np
-from collections import defaultdict
+from collections import defaultdict, Counter
 import os.path
 import fractions as frac
 
 import operator
 from ..utils import *
 
+## bit assigned to each element the first time it appears in a Phase
+_element_bits = {}
+
 class PhaseError(Exception):
     pass
 
 class PhaseDataError(Exception):
     pass
 
+def _pull_out_comp(composition, comp):
+    """
+    Removes as much of `comp` from `composition` as possible, returning the
+    residual composition with the amount of `comp` removed stored as 'var'.
+    """
+    residual = defaultdict(float, composition)
+    pres = min(residual[c]/amt for c, amt in comp.items())
+    for c, amt in comp.items():
+        residual[c] -= pres*amt
+    residual['var'] = pres
+    return residual
+
 class PhaseData(object):
     """
     A PhaseData object is a container for storing and organizing phase data.
@@ -23,13 +38,14 @@ class PhaseData(object):
         self.clear()
 
     def __str__(self):
-        return '%d Phases' % len(self.phases)
+        return '%d Phases' % len(self._phases)
 
     @property
     def phases(self):
         """
         List of all phases.
         """
+        self._load_pending()
         return self._phases
 
     @phases.setter
@@ -38,12 +54,42 @@ class PhaseData(object):
         for phase in phases:
             self.add_phase(phase)
 
+    @property
+    def phase_dict(self):
+        """
+        Dictionary of the lowest energy phase for each composition.
+        """
+        self._load_pending()
+        return self._phase_dict
+
+    @property
+    def phases_by_elt(self):
+        """
+        Dictionary of sets of phases containing each element.
+        """
+        self._load_pending()
+        return self._phases_by_elt
+
+    @property
+    def phases_by_dim(self):
+        """
+        Dictionary of sets of phases with each number of elements.
+        """
+        self._load_pending()
+        return self._phases_by_dim
+
     def clear(self):
         self._phases = []
-        self.phases_by_elt = defaultdict(set)
-        self.phases_by_dim = defaultdict(set)
-        self.phase_dict = {}
+        self._pending = []
+        self._phases_by_elt = defaultdict(set)
+        self._phases_by_dim = defaultdict(set)
+        self._phase_dict = {}
         self.space = set()
+        self._elt_index = {}
+        self._comp_rows = []
+        self._energy_rows = []
+        self._mask_rows = []
+        self._arrays = None
 
     def add_phase(self, phase):
         """
@@ -61,19 +107,53 @@ class PhaseData(object):
             [<Phase Fe2O3 : -3>, <Phase Fe2O3 : -4>, <Phase Fe2O3 : -5>]
         """
 
-        if not phase.name in self.phase_dict:
-            self.phase_dict[phase.name] = phase
-        else:
-            if phase.energy < self.phase_dict[phase.name].energy:
-                self.phase_dict[phase.name] = phase
         self._phases.append(phase)
         phase.index = len(self._phases)
+        self._index_phase(phase)
+
+        self.space |= set(phase.comp.keys())
+        self._add_row(phase.unit_comp, phase.energy)
+
+    def _index_phase(self, phase):
+        if not phase.name in self._phase_dict:
+            self._phase_dict[phase.name] = phase
+        else:
+            if phase.energy < self._phase_dict[phase.name].energy:
+                self._phase_dict[phase.name] = phase
 
         for elt in phase.comp:
-            self.phases_by_elt[elt].add(phase)
-        self.phases_by_dim[len(phase.comp)].add(phase)
+            self._phases_by_elt[elt].add(phase)
+        self._phases_by_dim[len(phase.comp)].add(phase)
 
-        self.space |= set(phase.comp.keys())
+    def _load_pending(self):
+        """
+        Creates the Phase objects for records read by `read_api_data_bulk`.
+        """
+        pending, self._pending = self._pending, []
+        for i, name, energy in pending:
+            phase = Phase(composition=name, energy=energy)
+            phase.index = i + 1
+            self._phases[i] = phase
+            self._index_phase(phase)
+
+    def _add_row(self, composition, energy):
+        """
+        Append a unit composition and energy to the array representation
+        returned by `as_arrays`. Elements are assigned columns in the order
+        they are first seen.
+        """
+        for elt in composition:
+            if not elt in self._elt_index:
+                self._elt_index[elt] = len(self._elt_index)
+        row = np.zeros(len(self._elt_index))
+        mask = np.zeros(len(self._elt_index), dtype=bool)
+        for elt, amt in composition.items():
+            row[self._elt_index[elt]] = amt
+            mask[self._elt_index[elt]] = True
+        self._comp_rows.append(row)
+        self._mask_rows.append(mask)
+        self._energy_rows.append(energy)
+        self._arrays = None
 
     def add_phases(self, phases):
         """
@@ -86,6 +166,76 @@ class PhaseData(object):
         for phase in phases:
             self.add_phase(phase)
 
+    def as_arrays(self):
+        """
+        Returns the phases as a (# of phases, # of elements) array of unit
+        compositions and a (# of phases,) array of current energies per atom.
+        Columns follow the order in which elements were first added; rows
+        follow PhaseData.phases.
+        Examples::
+            >>> pd = PhaseData()
+            >>> pd.add_phase(Phase(composition='Fe2O3', energy=-1.5))
+            >>> pd.add_phase(Phase(composition='O', energy=0))
+            >>> pd.as_arrays()
+            (array([[ 0.4,  0.6],
+                   [ 0. ,  1. ]]), array([-1.5,  0. ]))
+        """
+        comp = self._get_arrays()[0]
+        energy = np.array([ e if p is None else p.energy for p, e in
+                zip(self._phases, self._energy_rows) ], dtype=float)
+        return comp, energy
+
+    def _get_arrays(self):
+        """
+        Composition and element mask arrays. Energies are not cached here,
+        since phases can have their energy changed after being added.
+        """
+        if self._arrays is None:
+            shape = (len(self._comp_rows), len(self._elt_index))
+            comp = np.zeros(shape)
+            mask = np.zeros(shape, dtype=bool)
+            for i, (row, mrow) in enumerate(zip(self._comp_rows,
+                    self._mask_rows)):
+                comp[i, :len(row)] = row
+                mask[i, :len(mrow)] = mrow
+            self._arrays = (comp, mask)
+        return self._arrays
+
+    def formation_energy_vector(self, mus):
+        """
+        Returns the energy per atom of every phase relative to the elemental
+        reference energies in `mus` (elements not in `mus` are referenced to
+        0), in the same order as PhaseData.phases.
+        Examples::
+            >>> pd = PhaseData()
+            >>> pd.add_phase(Phase(composition='Fe2O3', energy=-8.0))
+            >>> pd.add_phase(Phase(composition='O', energy=-5.0))
+            >>> pd.formation_energy_vector({'Fe':-8.0, 'O':-5.0})
+            array([-1.8,  0. ])
+        """
+        comp, energy = self.as_arrays()
+        mu_vec = np.array([ mus.get(elt, 0.0) for elt in self._elt_index ])
+        return energy - comp.dot(mu_vec)
+
+    def phases_in_space(self, space):
+        """
+        Returns the list of phases whose elements are all contained in
+        `space`.
+        Examples::
+            >>> pd = PhaseData()
+            >>> pd.add_phase(Phase(composition='Fe2O3', energy=-1.5))
+            >>> pd.add_phase(Phase(composition='LiFeO2', energy=-1.8))
+            >>> pd.phases_in_space(['Fe', 'O'])
+            [<Phase Fe2O3 : -1.5>]
+        """
+        mask = self._get_arrays()[1]
+        space = set(space)
+        others = [ i for elt, i in self._elt_index.items()
+                if not elt in space ]
+        rows = np.flatnonzero(~mask[:, others].any(axis=1))
+        phases = self.phases
+        return [ phases[i] for i in rows ]
+
     def read_api_data(self, jsondata, per_atom=True):
         if jsondata.get('data', []) == []:
             print("No data found")
@@ -98,16 +248,43 @@ class PhaseData(object):
                           per_atom=per_atom)
             self.add_phase(phase)
 
+    def read_api_data_bulk(self, jsondata, per_atom=True):
+        """
+        Equivalent to `read_api_data`, but only fills in the array
+        representation used by `as_arrays`. Phase objects are not created
+        until PhaseData.phases (or phase_dict, phases_by_elt, phases_by_dim)
+        is first accessed, so callers that only need the composition and
+        energy arrays never pay for them.
+        Examples::
+            >>> pd = PhaseData()
+            >>> pd.read_api_data_bulk({'data': [
+            ...     {'name': 'Fe2O3', 'delta_e': -1.5},
+            ...     {'name': 'O', 'delta_e': 0}]})
+            >>> pd.as_arrays()
+            (array([[ 0.4,  0.6],
+                   [ 0. ,  1. ]]), array([-1.5,  0. ]))
+        """
+        if jsondata.get('data', []) == []:
+            print("No data found")
+            return
+        for d in jsondata['data']:
+            if 'name' not in d or 'delta_e' not in d:
+                continue
+            comp = parse_comp(d['name'])
+            energy = float(d['delta_e'])
+            if not per_atom:
+                energy /= sum(comp.values())
+            self._pending.append((len(self._phases), d['name'], energy))
+            self._phases.append(None)
+            self.space |= set(comp.keys())
+            self._add_row(unit_comp(comp), energy)
+
     def get_phase_data(self, space):
         if not space:
             return self
 
-        phases = set(self.phases)
-        others = set(self.phases_by_elt.keys()) - set(space)
-        for elt in others:
-            phases -= self.phases_by_elt[elt]
         pd = PhaseData()
-        pd.phases = phases
+        pd.phases = list(dict.fromkeys(self.phases_in_space(space)))
         return pd
 
 class Phase(object):
@@ -126,11 +303,12 @@ class Phase(object):
         True
     """
 
-    id = None
-    use = True
-    show_label = True
-    custom_name = None
-    phase_dict = {}
+    __slots__ = ('_comp', 'unit_comp', 'nom_comp', 'n', 'natoms', '_key',
+            'space', '_space_bits', '_name_cache', '_hash', '_energy',
+            '_total_energy', '_energy_pfu',
+            'description', 'stability', '_custom_name', '_phase_dict', 'index',
+            'id', 'use', 'show_label')
+
     def __init__(self,
             composition=None,
             energy=None,
@@ -145,8 +323,17 @@ class Phase(object):
         if isinstance(composition, str):
             composition = parse_comp(composition)
 
+        self.id = None
+        self.use = True
+        self.show_label = True
+        self.custom_name = None
+        self.phase_dict = {}
+        self.index = None
         self.description = description
-        self.comp = defaultdict(float, composition)
+        if all(isinstance(v, int) for v in composition.values()):
+            self.comp = Counter(composition)
+        else:
+            self.comp = defaultdict(float, composition)
         self.stability = stability
         if name:
             self.custom_name = name
@@ -163,15 +350,15 @@ class Phase(object):
         composite phase of unit composition.
         """
         if len(phase_dict) == 1:
-            return phase_dict.keys()[0]
+            return next(iter(phase_dict))
 
         pkeys = sorted(phase_dict.keys(), key=lambda x: x.name)
         energy = sum([ amt*p.energy for p, amt in phase_dict.items() ])
 
-        comp = defaultdict(float)
+        comp = {}
         for p, factor in phase_dict.items():
             for e, amt in p.unit_comp.items():
-                comp[e] += amt*factor
+                comp[e] = comp.get(e, 0.0) + amt*factor
 
         phase = Phase(
                 composition=comp,
@@ -180,10 +367,6 @@ class Phase(object):
         phase.phase_dict = phase_dict
         return phase
 
-    @property
-    def natoms(self):
-        return sum(self.nom_comp.values())
-
     def __str__(self):
         if self.description:
             return '{name} ({description}): {energy:0.3g}'.format(
@@ -196,77 +379,91 @@ class Phase(object):
         return '<Phase %s>' % self
 
     def __hash__(self):
-        return hash((self.name, self.energy))
+        return self._hash
 
     def __eq__(self, other):
         """
         Phases are defined to be equal if they have the same composition and an
         energy within 1e-6 eV/atom.
         """
-        if set(self.comp) != set(other.comp):
-            return False
-        if abs(self.energy - other.energy) > 1e-6:
-           return False
-        for key in self.comp:
-           if abs(self.unit_comp[key]-other.unit_comp[key]) > 1e-6:
-                return False
-        return True
+        return (self._key == other._key and
+                abs(self.energy - other.energy) <= 1e-6)
 
     @property
     def label(self):
         return '%s: %0.3f eV/atom' % (self.name, self.energy)
 
     @property
-    def name(self):
-        if self.custom_name:
-            return self.custom_name
-        if self.phase_dict:
-            name_dict = dict((p, v/p.natoms) for p, v in
-                    self.phase_dict.items())
-            return ' + '.join('%.3g %s' % (v, p.name) for p, v in name_dict.items())
-        return format_comp(self.nom_comp)
-
-    @property
-    def space(self):
+    def custom_name(self):
         """
-        Set of elements in the phase.
+        Name to use in place of the formula.
         """
-        return set([ k for k, v in self.unit_comp.items()
-            if abs(v) > 1e-6 ])
+        return self._custom_name
+
+    @custom_name.setter
+    def custom_name(self, name):
+        self._custom_name = name
+        self._name_cache = None
 
     @property
-    def n(self):
+    def phase_dict(self):
         """
-        Number of atoms in the total composition.
+        Dictionary of the phases (and amounts) a composite phase is made of.
         """
-        return sum(self._comp.values())
+        return self._phase_dict
+
+    @phase_dict.setter
+    def phase_dict(self, phase_dict):
+        self._phase_dict = phase_dict
+        self._name_cache = None
+
+    @property
+    def name(self):
+        if self._name_cache is None:
+            if self.custom_name:
+                self._name_cache = self.custom_name
+            elif self.phase_dict:
+                name_dict = dict((p, v/p.natoms) for p, v in
+                        self.phase_dict.items())
+                self._name_cache = ' + '.join('%.3g %s' % (v, p.name)
+                        for p, v in name_dict.items())
+            else:
+                self._name_cache = format_comp(self.nom_comp)
+        return self._name_cache
 
     @property
     def comp(self):
         """
         Total composition.
+
+        Setting the composition also sets the derived attributes:
+            unit_comp: composition normalized to one atom.
+            nom_comp: composition divided by the GCD. e.g. Fe4O6 becomes Fe2O3.
+            n: number of atoms in the total composition.
+            natoms: number of atoms in the nominal composition.
+            space: frozenset of elements in the phase.
         """
         return self._comp
 
     @comp.setter
     def comp(self, composition):
         self._comp = composition
-        self._unit_comp = unit_comp(composition)
-        self._nom_comp = reduce_comp(composition)
-
-    @property
-    def unit_comp(self):
-        """
-        Unit composition.
-        """
-        return self._unit_comp
-
-    @property
-    def nom_comp(self):
-        """
-        Composition divided by the GCD. e.g. Fe4O6 becomes Fe2O3.
-        """
-        return self._nom_comp
+        self._name_cache = None
+        self.unit_comp = unit_comp(composition)
+        self.nom_comp = reduce_comp(composition)
+        self.n = sum(composition.values())
+        self.natoms = sum(self.nom_comp.values())
+        self.space = frozenset(k for k, v in self.unit_comp.items()
+                if abs(v) > 1e-6)
+        self._space_bits = 0
+        for k in self.space:
+            if not k in _element_bits:
+                _element_bits[k] = len(_element_bits)
+            self._space_bits |= 1 << _element_bits[k]
+        elts = sorted(self.unit_comp)
+        self._key = (tuple(elts),
+                tuple(int(round(self.unit_comp[k]*1e6)) for k in elts))
+        self._hash = hash(self._key)
 
     @property
     def energy(self):
@@ -278,8 +475,8 @@ class Phase(object):
     @energy.setter
     def energy(self, energy):
         self._energy = energy
-        self._total_energy = energy * sum(self.comp.values())
-        self._energy_pfu = energy / sum(self.nom_comp.values())
+        self._total_energy = energy * self.n
+        self._energy_pfu = energy * self.natoms
 
     @property
     def total_energy(self):
@@ -291,8 +488,8 @@ class Phase(object):
     @total_energy.setter
     def total_energy(self, energy):
         self._total_energy = energy
-        self._energy = energy/sum(self.comp.values())
-        self._energy_pfu = energy / sum(self.nom_comp.values())
+        self._energy = energy/self.n
+        self._energy_pfu = self._energy * self.natoms
 
     @property
     def energy_pfu(self):
@@ -312,21 +509,13 @@ class Phase(object):
         Examples::
             >>> phase = Phase(composition={'Fe':1, 'Li':5, 'O':8}, energy=-1)
             >>> phase.amt('Li2O')
-            defaultdict(<type 'float'>, {'var': 2.5, 'Fe': 1, 'O': 5.5, 'Li': 0.0})
+            defaultdict(<class 'float'>, {'Fe': 1, 'Li': 0.0, 'O': 5.5, 'var': 2.5})
         """
         if isinstance(comp, Phase):
             comp = comp.comp
         elif isinstance(comp, str):
             comp = parse_comp(comp)
-        residual = defaultdict(float, self.comp)
-        tot = sum(residual.values())
-        for c, amt in dict(comp).items():
-            pres = residual[c]/amt
-            for c2, amt2 in comp.items():
-                residual[c2] -= pres*amt2
-        residual['var'] = (tot - sum(residual.values()))
-        residual['var'] /= float(sum(comp.values()))
-        return residual
+        return _pull_out_comp(self.comp, comp)
 
     def fraction(self, comp):
         """
@@ -335,19 +524,11 @@ class Phase(object):
         Examples::
             >>> phase = Phase(composition={'Fe':1, 'Li':5, 'O':8}, energy=-1)
             >>> phase.fraction('Li2O')
-            defaultdict(<type 'float'>, {'var': 0.5357142857142858, 'Fe':
-                0.07142857142857142, 'O': 0.3928571428571428, 'Li': 0.0})
+            defaultdict(<class 'float'>, {'Fe': 0.07142857142857142, 'Li': 0.0,
+                'O': 0.3928571428571428, 'var': 0.5357142857142858})
         """
         if isinstance(comp, Phase):
             comp = comp.unit_comp
         elif isinstance(comp, str):
             comp = unit_comp(parse_comp(comp))
-        residual = defaultdict(float, self.unit_comp)
-        tot = sum(residual.values())
-        for c, amt in dict(comp).items():
-            pres = residual[c]/amt
-            for c2, amt2 in comp.items():
-                residual[c2] -= pres*amt2
-        residual['var'] = (tot - sum(residual.values()))
-        residual['var'] /= float(sum(comp.values()))
-        return residual
+        return _pull_out_comp(self.unit_comp, comp)
@@ -1,4 +1,5 @@
 from unittest import TestCase
+from collections import Counter, defaultdict
 
 import qmpy_rester as qr
 
@@ -47,3 +48,134 @@ class TestPhaseDiagram(TestCase):
         self.assertTrue(isinstance(d.unstable, list))
         for p in d.unstable:
             self.assertTrue(isinstance(p, qr.Phase))
+
+class TestPhaseData(TestCase):
+    def test_phase_data_as_arrays(self):
+        pd = qr.PhaseData()
+        pd.add_phase(qr.Phase(composition='Fe2O3', energy=-1.5))
+        pd.add_phase(qr.Phase(composition='O', energy=0))
+        comp, energy = pd.as_arrays()
+
+        self.assertEqual(comp.shape, (2, 2))
+        self.assertEqual(comp.tolist(), [[0.4, 0.6], [0.0, 1.0]])
+        self.assertEqual(energy.tolist(), [-1.5, 0.0])
+
+    def test_phase_data_phases_in_space(self):
+        pd = qr.PhaseData()
+        fe2o3 = qr.Phase(composition='Fe2O3', energy=-1.5)
+        pd.add_phase(fe2o3)
+        pd.add_phase(qr.Phase(composition='LiFeO2', energy=-1.8))
+
+        self.assertEqual(pd.phases_in_space(['Fe', 'O']), [fe2o3])
+        self.assertEqual(len(pd.phases_in_space(['Fe', 'Li', 'O'])), 2)
+        self.assertEqual(len(pd.get_phase_data(['Fe', 'O']).phases), 1)
+
+    def test_phase_data_get_phase_data_unique(self):
+        pd = qr.PhaseData()
+        pd.add_phase(qr.Phase(composition='Fe2O3', energy=-1))
+        pd.add_phase(qr.Phase(composition='Fe2O3', energy=-1))
+        for comp, energy in [('FeO', -1.2), ('LiFeO2', -1.8), ('O', 0),
+                ('Fe', 0)]:
+            pd.add_phase(qr.Phase(composition=comp, energy=energy))
+
+        phases = pd.get_phase_data(['Fe', 'O']).phases
+        self.assertEqual([ p.name for p in phases ],
+                ['Fe2O3', 'FeO', 'O', 'Fe'])
+
+    def test_phase_data_read_api_data_bulk(self):
+        data = {'data': [{'name': 'Fe2O3', 'delta_e': -1.5},
+                         {'name': 'O', 'delta_e': 0}]}
+        pd = qr.PhaseData()
+        pd.read_api_data_bulk(data)
+        comp, energy = pd.as_arrays()
+        self.assertEqual(comp.tolist(), [[0.4, 0.6], [0.0, 1.0]])
+        self.assertEqual(energy.tolist(), [-1.5, 0.0])
+
+        ref = qr.PhaseData()
+        ref.read_api_data(data)
+        self.assertEqual(pd.phases, ref.phases)
+        self.assertEqual(sorted(pd.phase_dict), sorted(ref.phase_dict))
+
+    def test_phase_data_formation_energy_vector(self):
+        pd = qr.PhaseData()
+        pd.add_phase(qr.Phase(composition='FeO', energy=-7.0))
+        pd.add_phase(qr.Phase(composition='O', energy=-5.0))
+        ef = pd.formation_energy_vector({'Fe': -8.0, 'O': -5.0})
+        self.assertEqual(ef.tolist(), [-0.5, 0.0])
+
+    def test_phase_data_arrays_follow_phase_energies(self):
+        pd = qr.PhaseData()
+        for comp, energy in [('Fe', -8), ('O', -5), ('Fe2O3', -9)]:
+            pd.add_phase(qr.Phase(composition=comp, energy=energy))
+        pd.as_arrays()
+        ps = qr.PhaseSpace('Fe-O', data=pd)
+        ps.infer_formation_energies()
+
+        energies = [ p.energy for p in pd.phases ]
+        self.assertAlmostEqual(energies[2], -2.8)
+        for value, expected in zip(pd.as_arrays()[1], energies):
+            self.assertAlmostEqual(value, expected)
+        for value, expected in zip(pd.formation_energy_vector({}), energies):
+            self.assertAlmostEqual(value, expected)
+
+class TestPhase(TestCase):
+    def test_phase_from_phases(self):
+        fe = qr.Phase(composition='Fe', energy=0)
+        o = qr.Phase(composition='O', energy=0)
+        feo = qr.Phase(composition='FeO', energy=-1.5)
+        phase = qr.Phase.from_phases({fe: 0.5, o: 0.5, feo: 1.0})
+
+        self.assertEqual(dict(phase.comp), {'Fe': 1.0, 'O': 1.0})
+        self.assertEqual(phase.total_energy, -1.5)
+        self.assertIs(qr.Phase.from_phases({feo: 1.0}), feo)
+
+    def test_phase_integer_comp(self):
+        phase = qr.Phase(composition='Fe2O3', energy=-1)
+        self.assertIs(type(phase.comp), Counter)
+        self.assertEqual(phase.comp, {'Fe': 2, 'O': 3})
+        self.assertTrue(all(type(v) is int for v in phase.comp.values()))
+
+        phase = qr.Phase(composition={'Fe': 2.0, 'O': 3.0}, energy=-1)
+        self.assertIs(type(phase.comp), defaultdict)
+
+    def test_phase_hash_matches_eq(self):
+        p1 = qr.Phase(composition='Fe', energy=4e-7)
+        p2 = qr.Phase(composition='Fe', energy=6e-7)
+        self.assertEqual(p1, p2)
+        self.assertEqual(hash(p1), hash(p2))
+        self.assertEqual(len({p1, p2}), 1)
+
+    def test_phase_name_follows_custom_name(self):
+        phase = qr.Phase(composition='Fe2O3', energy=-1)
+        self.assertEqual(phase.name, 'Fe2O3')
+        phase.custom_name = 'hematite'
+        self.assertEqual(phase.name, 'hematite')
+        phase.custom_name = None
+        phase.phase_dict = {qr.Phase(composition='FeO', energy=-1): 2.0}
+        self.assertEqual(phase.name, '1 FeO')
+
+    def assertCompAlmostEqual(self, comp, expected):
+        self.assertEqual(set(comp), set(expected))
+        for k, v in expected.items():
+            self.assertAlmostEqual(comp[k], v)
+
+    def test_phase_amt(self):
+        phase = qr.Phase(composition={'Fe':1, 'Li':5, 'O':8}, energy=-1)
+        self.assertCompAlmostEqual(phase.amt('Li2O'),
+                {'Fe': 1, 'Li': 0, 'O': 5.5, 'var': 2.5})
+        self.assertCompAlmostEqual(phase.amt(qr.Phase('Li2O', -2)),
+                {'Fe': 1, 'Li': 0, 'O': 5.5, 'var': 2.5})
+
+    def test_phase_amt_extra_element(self):
+        phase = qr.Phase(composition='Fe2O3', energy=-1)
+        self.assertCompAlmostEqual(phase.amt({'Li':1}),
+                {'Fe': 2, 'O': 3, 'Li': 0, 'var': 0})
+        with self.assertRaises(ZeroDivisionError):
+            phase.amt({'Fe':1, 'O':0})
+
+    def test_phase_fraction(self):
+        phase = qr.Phase(composition={'Fe':1, 'Li':5, 'O':8}, energy=-1)
+        expected = {'Fe': 1/14., 'Li': 0, 'O': 5.5/14, 'var': 7.5/14}
+        self.assertCompAlmostEqual(phase.fraction('Li2O'), expected)
+        self.assertCompAlmostEqual(phase.fraction(qr.Phase('Li2O', -2)),
+                expected)
@@ -4,6 +4,7 @@ import numpy as np
 import re
 import yaml
 import fractions as frac
+from functools import lru_cache
 
 from .math import *
 from ..data import elements
@@ -12,6 +13,8 @@ from ..data import elements
 re_comp = re.compile('({[^}]*}[,0-9x\.]*|[A-Z][a-wyz]?)([,0-9x\.]*)')
 spec_comp = re.compile('([A-Z][a-z]?)([0-9\.]*)([+-]?)')
 re_formula = re.compile('([A-Z][a-z]?)([0-9\.]*)')
+re_formula_term = re.compile('({[^}]*}[,0-9x\.]*|[A-Z][a-wyz]?[,0-9x\.]*)')
+re_space_delim = re.compile('[-,_]')
 alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
 ## Parsing
@@ -40,7 +43,11 @@ def parse_mu(value):
     return {elt: pot}
 
 def parse_comp(value):
-    comp = defaultdict(float)
+    return dict(_parse_comp(value))
+
+@lru_cache(maxsize=1<<16)
+def _parse_comp(value):
+    comp = defaultdict(int)
     for elt, amt in re_formula.findall(value):
         if elt in ['D', 'T']:
             elt = 'H'
@@ -50,11 +57,11 @@ def parse_comp(value):
             comp[elt] += int(round(float(amt)))
         else:
             comp[elt] += float(amt)
-    return dict(comp)
+    return tuple(comp.items())
 
 def parse_space(value):
     if isinstance(value, str):
-        space = re.sub('[-,_]', ' ', value)
+        space = re_space_delim.sub(' ', value)
         space = [ unit_comp(parse_comp(b)) for b in space.split()]
     elif isinstance(value, (list,set)):
         space = [ {elt:1} for elt in value ]
@@ -236,6 +243,8 @@ def reduce_comp(values, method='auto'):
     do consistently. This function calls several functions which attempt to
     find a "good" composition string, and attempts to discern which is best.
 
+        a) If every coefficient is an integer, divide them all by their GCD.
+
         b) If that fails (i.e. the GCD < 1e-10, and there is no accurate
         rational value ), try multiplying the coefficients by the first 20
         prime numbers. For example: if your coefficients are 
@@ -267,6 +276,13 @@ def reduce_comp(values, method='auto'):
         else:
             return values
 
+    if all(float(v).is_integer() for v in values):
+        ints = np.fromiter((int(v) for v in values), dtype=np.int64,
+                count=len(values))
+        divisor = int(np.gcd.reduce(ints))
+        if divisor:
+            return make_return((ints // divisor).tolist())
+
     first = reduce_by_gcd(values)
     if all( v < 1000 for v in first):
         return make_return(first)
@@ -319,8 +335,7 @@ def parse_formula_regex(formula):
 
     """
     formulae = []
-    sfind = re.compile('({[^}]*}[,0-9x\.]*|[A-Z][a-wyz]?[,0-9x\.]*)')
-    matches = sfind.findall(formula)
+    matches = re_formula_term.findall(formula)
     for term in matches:
         if '{' in term:
             symbols, amt = term.replace('{','').split('}')